@@ -3,25 +3,155 @@
 Скрипт построения графиков по результатам бенчмарков аллокаторов памяти
 Требуется: matplotlib, pandas
 Установка: pip3 install matplotlib pandas
+Опционально: pyarrow (ускоряет чтение CSV)
 """
 
+from __future__ import annotations
+
 import sys
 import os
 import argparse
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg')
+import functools
+import importlib.util
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+# numpy/pandas/matplotlib импортируются лениво (см. _import_plotting):
+# на --help и ошибках в аргументах их загрузка занимала почти всё время запуска
+np = None
+pd = None
+plt = None
+
+# pyarrow не обязателен: без него читаем CSV стандартным C-парсером pandas
+_HAVE_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+# Типы колонок при чтении CSV: category превращает строки в целочисленные коды,
+# float32 вдвое уменьшает объём данных для времён и PeakUtilization.
+# Счётчики операций остаются int64 (int32 при чтении молча переполняется),
+# ops/sec — float64: в них 8–9 значащих цифр, float32 хранит около 7
+READ_DTYPES = {
+    'Allocator': 'category',
+    'Benchmark': 'category',
+    'AllocTime_us': 'float32',
+    'FreeTime_us': 'float32',
+    'AllocOps': 'int64',
+    'FreeOps': 'int64',
+    'AllocOpsPerSec': 'float64',
+    'FreeOpsPerSec': 'float64',
+    'PeakUtilization': 'float32',
+}
+
+# Стандартные сценарии бенчмарка в порядке вывода на графиках
+PREFERRED_BENCHMARKS = ('Sequential', 'Random', 'Mixed', 'Stress')
+_PREFERRED_SET = frozenset(PREFERRED_BENCHMARKS)
+
+# Метрики, по которым строятся графики и сводка
+METRIC_COLS = ['AllocOpsPerSec', 'FreeOpsPerSec', 'PeakUtilization']
+
+# Разрешение PNG: по умолчанию достаточное для отчётов и CI, --publish — для печати
+DEFAULT_DPI = 150
+PUBLISH_DPI = 300
+
+# Поддерживаемые форматы вывода: PNG растеризуется через Agg, SVG/PDF — векторные
+OUTPUT_FORMATS = ('png', 'svg', 'pdf')
+
+# Кегль текстовой сводки сравнительного графика и нижняя граница, до которой
+# его можно уменьшать, чтобы сводка поместилась (см. plot_comparison)
+SUMMARY_FONTSIZE = 11
+SUMMARY_MIN_FONTSIZE = 8
+
+# Переиспользуемые фигуры по (сетка осей, размер), см. _get_fig
+_FIG_CACHE = {}
+
+# Фоновая запись готовых изображений на диск (см. _save_figure, _flush_writes)
+_WRITE_POOL = None
+_PENDING_WRITES = []
+
+# Кэш разобранных CSV (см. _load); отключается флагом --no-cache
+_CACHE_ENABLED = True
+
+
+def _import_plotting() -> None:
+    """Импортировать numpy/pandas/matplotlib при первом построении графика"""
+
+    global np, pd, plt
+    if plt is not None:
+        return
+    import numpy as np
+    import pandas as pd
+    import matplotlib
+    matplotlib.use('Agg')
+    # Упрощение путей перед растеризацией и отрисовка длинных путей кусками в Agg
+    matplotlib.rcParams['path.simplify'] = True
+    matplotlib.rcParams['path.simplify_threshold'] = 1.0
+    matplotlib.rcParams['agg.path.chunksize'] = 10000
+    import matplotlib.pyplot as plt
+
+
+def _read_csv(path: str) -> pd.DataFrame:
+    """Прочитать CSV; при наличии pyarrow используется его многопоточный парсер
+
+    Колонки читаются сразу в типах из READ_DTYPES, строковые — как category.
+    Если ячейку не удаётся разобрать в заданный тип (например, нечисловое
+    значение в числовой колонке), читаем файл без подсказок, чтобы проверки
+    и графики всё равно отработали
+    """
+
+    kwargs = {'engine': 'pyarrow'} if _HAVE_PYARROW else {}
+    try:
+        return pd.read_csv(path, dtype=READ_DTYPES, **kwargs)
+    except (ValueError, TypeError, OverflowError):
+        return pd.read_csv(path, **kwargs)
+
+
+@functools.lru_cache(maxsize=64)
+def _load_cached(path: str, mtime_ns: int, size: int) -> pd.DataFrame:
+    # mtime и размер входят в ключ, чтобы перезаписанный CSV читался заново
+    return _read_csv(path)
+
+
+def _load(path: str) -> pd.DataFrame:
+    """Прочитать CSV через кэш разобранных файлов (общий для всех режимов)
+
+    Возвращаемый DataFrame может быть общим для нескольких вызовов,
+    поэтому изменять его на месте нельзя
+    """
+
+    if not _CACHE_ENABLED:
+        return _read_csv(path)
+    st = os.stat(path)
+    return _load_cached(path, st.st_mtime_ns, st.st_size)
 
 
 def _ordered_benchmarks(series: pd.Series) -> list[str]:
     """Вернуть список сценариев (Benchmark) в стабильном порядке"""
 
-    preferred = ['Sequential', 'Random', 'Mixed', 'Stress']
-    unique = list(pd.unique(series.dropna()))
-    if all(b in unique for b in preferred):
-        return preferred
-    return sorted(unique)
+    # У категориального столбца набор значений уже известен — берём категории
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        names = frozenset(series.cat.categories)
+    else:
+        names = frozenset(pd.unique(series.dropna()))
+    if _PREFERRED_SET.issubset(names):
+        return list(PREFERRED_BENCHMARKS)
+    return sorted(names)
+
+
+def _metric_pivots(df: pd.DataFrame,
+                   benchmark_order: list[str]) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Сводные таблицы средних для графиков: alloc и free ops/sec (сценарий x аллокатор)
+    и PeakUtilization (аллокатор x сценарий)
+
+    Все три берутся из одной группировки по (Benchmark, Allocator), поэтому
+    ключи факторизуются и значения агрегируются один раз. Аллокаторы
+    сортируются, как в pivot/pivot_table: от этого зависят порядок легенды
+    и цвета столбцов, и они не должны зависеть от порядка строк и файлов
+    """
+
+    agg = df.groupby(['Benchmark', 'Allocator'], observed=True, sort=False)[METRIC_COLS].mean()
+    pivot_alloc = agg['AllocOpsPerSec'].unstack('Allocator').sort_index(axis=1).reindex(benchmark_order)
+    pivot_free = agg['FreeOpsPerSec'].unstack('Allocator').sort_index(axis=1).reindex(benchmark_order)
+    pivot_util = agg['PeakUtilization'].unstack('Benchmark').sort_index().reindex(columns=benchmark_order)
+    return pivot_alloc, pivot_free, pivot_util
 
 
 def _sanity_check_dataframe(df: pd.DataFrame) -> None:
@@ -33,78 +163,268 @@ def _sanity_check_dataframe(df: pd.DataFrame) -> None:
     заметно отличается между аллокаторами в одном сценарии
     """
 
-    # 1) Пересчитываем ops/sec из ops и времени и сверяемся с колонкой
-    def _rel_diff(a: float, b: float) -> float:
-        denom = max(abs(a), abs(b), 1e-12)
-        return abs(a - b) / denom
+    # 1) Пересчитываем ops/sec из ops и времени и сверяемся с колонкой.
+    # Всё считается по столбцам целиком; нечисловые значения превращаются в NaN
+    # и не дают предупреждений (как раньше такие строки просто пропускались)
+    def _col(name: str) -> np.ndarray:
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
 
-    for idx, row in df.iterrows():
-        try:
-            alloc_time_s = float(row['AllocTime_us']) * 1e-6
-            free_time_s = float(row['FreeTime_us']) * 1e-6
-            alloc_ops = float(row['AllocOps'])
-            free_ops = float(row['FreeOps'])
+    def _mismatch(calc: np.ndarray, file: np.ndarray) -> np.ndarray:
+        # Расхождение больше 1%; строки с NaN (нет данных или нулевое время) не считаются
+        known = np.isfinite(calc) & np.isfinite(file)
+        return known & ~np.isclose(calc, file, rtol=0.01, atol=1e-12)
 
-            calc_alloc = (alloc_ops / alloc_time_s) if alloc_time_s > 0 else float('inf')
-            calc_free = (free_ops / free_time_s) if free_time_s > 0 else float('inf')
-            file_alloc = float(row['AllocOpsPerSec'])
-            file_free = float(row['FreeOpsPerSec'])
+    try:
+        alloc_time_s = _col('AllocTime_us') * 1e-6
+        free_time_s = _col('FreeTime_us') * 1e-6
+        file_alloc = _col('AllocOpsPerSec')
+        file_free = _col('FreeOpsPerSec')
 
-            if _rel_diff(calc_alloc, file_alloc) > 0.01:
-                print(
-                    "Warning: AllocOpsPerSec mismatch for "
-                    f"Allocator={row['Allocator']} Benchmark={row['Benchmark']}: "
-                    f"csv={file_alloc:.2f}, recomputed={calc_alloc:.2f}"
-                )
-            if _rel_diff(calc_free, file_free) > 0.01:
-                print(
-                    "Warning: FreeOpsPerSec mismatch for "
-                    f"Allocator={row['Allocator']} Benchmark={row['Benchmark']}: "
-                    f"csv={file_free:.2f}, recomputed={calc_free:.2f}"
-                )
+        # При нулевом времени сравнивать не с чем: NaN гасит предупреждение
+        with np.errstate(divide='ignore', invalid='ignore'):
+            calc_alloc = _col('AllocOps') / np.where(alloc_time_s > 0, alloc_time_s, np.nan)
+            calc_free = _col('FreeOps') / np.where(free_time_s > 0, free_time_s, np.nan)
+        alloc_mismatch = _mismatch(calc_alloc, file_alloc)
+        free_mismatch = _mismatch(calc_free, file_free)
 
-            # 2) Слишком короткие измерения почти всегда дают шумные ops/sec
-            if row['Benchmark'] in ['Sequential', 'Random', 'Mixed', 'Stress']:
-                if alloc_time_s < 1e-4:  # < 0.1 ms
-                    print(
-                        "Warning: Very short allocation timing (<0.1ms) for "
-                        f"Allocator={row['Allocator']} Benchmark={row['Benchmark']}: "
-                        f"AllocTime_us={row['AllocTime_us']}"
-                    )
-                if free_time_s < 1e-4:
-                    print(
-                        "Warning: Very short free timing (<0.1ms) for "
-                        f"Allocator={row['Allocator']} Benchmark={row['Benchmark']}: "
-                        f"FreeTime_us={row['FreeTime_us']}"
-                    )
-        except Exception:
-            # Не мешаем построению графиков из-за проверки
-            continue
+        names = df[['Allocator', 'Benchmark']]
+        for (allocator, bench), file_v, calc_v in zip(names[alloc_mismatch].itertuples(index=False, name=None),
+                                                      file_alloc[alloc_mismatch], calc_alloc[alloc_mismatch]):
+            print(
+                "Warning: AllocOpsPerSec mismatch for "
+                f"Allocator={allocator} Benchmark={bench}: "
+                f"csv={file_v:.2f}, recomputed={calc_v:.2f}"
+            )
+        for (allocator, bench), file_v, calc_v in zip(names[free_mismatch].itertuples(index=False, name=None),
+                                                      file_free[free_mismatch], calc_free[free_mismatch]):
+            print(
+                "Warning: FreeOpsPerSec mismatch for "
+                f"Allocator={allocator} Benchmark={bench}: "
+                f"csv={file_v:.2f}, recomputed={calc_v:.2f}"
+            )
+
+        # 2) Слишком короткие измерения почти всегда дают шумные ops/sec
+        known = df['Benchmark'].isin(PREFERRED_BENCHMARKS).to_numpy()
+        short_alloc = known & (alloc_time_s < 1e-4)  # < 0.1 ms
+        short_free = known & (free_time_s < 1e-4)
+        short_alloc_rows = df.loc[short_alloc, ['Allocator', 'Benchmark', 'AllocTime_us']]
+        for allocator, bench, alloc_time_us in short_alloc_rows.itertuples(index=False, name=None):
+            print(
+                "Warning: Very short allocation timing (<0.1ms) for "
+                f"Allocator={allocator} Benchmark={bench}: "
+                f"AllocTime_us={alloc_time_us}"
+            )
+        short_free_rows = df.loc[short_free, ['Allocator', 'Benchmark', 'FreeTime_us']]
+        for allocator, bench, free_time_us in short_free_rows.itertuples(index=False, name=None):
+            print(
+                "Warning: Very short free timing (<0.1ms) for "
+                f"Allocator={allocator} Benchmark={bench}: "
+                f"FreeTime_us={free_time_us}"
+            )
+    except Exception:
+        # Не мешаем построению графиков из-за проверки
+        pass
 
     # 3) Подсветить различия в количестве успешных операций между аллокаторами в одном сценарии
     if 'Allocator' in df.columns and 'Benchmark' in df.columns and 'AllocOps' in df.columns:
-        by_bench = df.groupby('Benchmark')['AllocOps'].nunique(dropna=True)
+        by_bench = df.groupby('Benchmark', observed=True)['AllocOps'].nunique(dropna=True)
         diffs = by_bench[by_bench > 1]
         if not diffs.empty:
-            for bench in diffs.index.tolist():
-                rows = df[df['Benchmark'] == bench][['Allocator', 'AllocOps']]
-                details = ", ".join([f"{r['Allocator']}={int(r['AllocOps'])}" for _, r in rows.iterrows()])
+            # Строки всех проблемных сценариев отбираем одним проходом и
+            # разбиваем по сценариям группировкой, а не маской на каждый сценарий
+            offenders = df.loc[df['Benchmark'].isin(diffs.index), ['Benchmark', 'Allocator', 'AllocOps']]
+            for bench, rows in offenders.groupby('Benchmark', observed=True, sort=False):
+                details = ", ".join([f"{allocator}={int(alloc_ops)}"
+                                     for allocator, alloc_ops in
+                                     rows[['Allocator', 'AllocOps']].itertuples(index=False, name=None)])
                 print(
                     "Warning: Different successful AllocOps between allocators for "
                     f"Benchmark={bench}: {details}"
                 )
 
-def plot_results(csv_file, output_file=None):
-    """Построить графики по результатам бенчмарка из CSV-файла"""
+def _get_fig(shape: tuple[int, int], figsize: tuple[float, float], count: int | None = None):
+    """Вернуть фигуру с сеткой осей shape из кэша, очистив оси и текст фигуры
+
+    Создание осей (тики, рамки, преобразования) — самая дорогая часть
+    построения небольших графиков; очистка уже созданных заметно дешевле,
+    поэтому при нескольких графиках подряд фигура создаётся один раз.
+    count — сколько первых ячеек сетки занять осями (по умолчанию все)
+    """
+
+    key = (shape, figsize, count)
+    fig = _FIG_CACHE.get(key)
+    if fig is None:
+        fig = plt.figure(figsize=figsize)
+        n_axes = count if count is not None else shape[0] * shape[1]
+        for i in range(n_axes):
+            fig.add_subplot(*shape, i + 1)
+        if hasattr(fig, 'set_layout_engine'):
+            fig.set_layout_engine('tight')
+        else:
+            # matplotlib < 3.6: layout engine ещё нет, тот же эффект даёт tight_layout при отрисовке
+            fig.set_tight_layout(True)
+        _FIG_CACHE[key] = fig
+    else:
+        # Размер мог измениться под длинную сводку (см. plot_comparison)
+        fig.set_size_inches(figsize)
+        for ax in fig.axes:
+            ax.clear()
+        for text in list(fig.texts):
+            text.remove()
+    return fig
+
+
+def _apply_layout(fig) -> None:
+    """Сразу разместить оси фигуры так же, как это сделает отрисовка"""
+
+    # fig.tight_layout() в matplotlib >= 3.6 сбрасывает layout engine фигуры,
+    # а она переиспользуется из кэша, поэтому вызываем сам engine
+    engine = fig.get_layout_engine() if hasattr(fig, 'get_layout_engine') else None
+    if engine is not None:
+        engine.execute(fig)
+    else:
+        fig.tight_layout()
+
+
+def _text_height(text) -> float:
+    """Высота текста в пикселях вместе с нижним полем рамки; отрисовка фигуры не нужна"""
+
+    fig = text.figure
+    height = text.get_window_extent(fig.canvas.get_renderer()).height
+    patch = text.get_bbox_patch()
+    if patch is not None:
+        # Нижнее поле рамки (pad в долях кегля) и толщина её контура
+        height += (patch.get_boxstyle().pad * text.get_fontsize() + patch.get_linewidth()) * fig.dpi / 72
+    return height
+
+
+def _fit_text_height(text, max_height: float, min_fontsize: float) -> bool:
+    """Уменьшить кегль текста (не ниже min_fontsize), чтобы он уместился в max_height пикселей
+
+    max_height отсчитывается от верхней точки привязки текста. Высота почти
+    пропорциональна кеглю, но метрики шрифта округляются, поэтому после
+    уменьшения размер перепроверяется. Возвращает False, если текст не
+    помещается и при минимальном кегле
+    """
+
+    for _ in range(5):
+        height = _text_height(text)
+        if height <= max_height:
+            return True
+        fontsize = text.get_fontsize()
+        if fontsize <= min_fontsize:
+            return False
+        text.set_fontsize(max(fontsize * max_height / height * 0.99, min_fontsize))
+    return _text_height(text) <= max_height
+
+
+def _output_format(output_file: str | None, fmt: str | None) -> str | None:
+    """Определить формат изображения по расширению output_file и явному fmt
+
+    Расширение выходного файла главнее формата по умолчанию: -o plot.svg
+    пишет SVG. Если файл без расширения, берётся fmt (по умолчанию png).
+    Неподдерживаемое расширение или расхождение с явным fmt — ошибка (None),
+    чтобы не записать байты одного формата в файл с расширением другого
+    """
+
+    ext = os.path.splitext(output_file)[1][1:].lower() if output_file else ''
+    if not ext:
+        return fmt or 'png'
+    if ext not in OUTPUT_FORMATS:
+        print(f"Error: Unsupported output file extension: .{ext} (supported: {', '.join(OUTPUT_FORMATS)})")
+        return None
+    if fmt is not None and fmt != ext:
+        print(f"Error: --format {fmt} does not match output file extension .{ext}")
+        return None
+    return ext
+
+
+def _save_figure(fig, output_file: str, dpi: int, fmt: str, message: str) -> None:
+    """Сохранить фигуру в заданном формате
+
+    Разметку подгоняет layout engine 'tight' при отрисовке, поэтому
+    bbox_inches='tight' (лишний проход рендеринга) не нужен. dpi влияет
+    только на растровый PNG: SVG и PDF пишутся векторными без растеризации.
+
+    Фигура рендерится в память, а запись на диск уходит в фоновый поток,
+    чтобы следующий график готовился параллельно с записью предыдущего.
+    message печатается только после успешной записи файла: для уже
+    завершённых записей — при следующем сохранении, для остальных —
+    в _flush_writes()
+    """
+
+    _report_writes(wait=False)
+
+    buf = io.BytesIO()
+    if fmt == 'png':
+        fig.savefig(buf, format=fmt, dpi=dpi)
+    else:
+        fig.savefig(buf, format=fmt)
+
+    global _WRITE_POOL
+    if _WRITE_POOL is None:
+        _WRITE_POOL = ThreadPoolExecutor(max_workers=2)
+    future = _WRITE_POOL.submit(_write_file, output_file, buf.getvalue())
+    _PENDING_WRITES.append((output_file, future, message))
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _report_writes(wait: bool) -> bool:
+    """Сообщить о завершённых фоновых записях в порядке их постановки
+
+    При wait=True дожидается всех записей, иначе останавливается на первой
+    незавершённой. Возвращает False, если какая-то из них не удалась
+    """
+
+    ok = True
+    while _PENDING_WRITES:
+        path, fut, message = _PENDING_WRITES[0]
+        if not wait and not fut.done():
+            break
+        _PENDING_WRITES.pop(0)
+        try:
+            fut.result()
+        except OSError as e:
+            print(f"Error writing {path}: {e}")
+            ok = False
+        else:
+            print(message)
+    return ok
+
+
+def _flush_writes() -> bool:
+    """Дождаться фоновой записи файлов; вернуть False, если какая-то запись не удалась"""
+
+    return _report_writes(wait=True)
+
+
+def plot_results(csv_file, output_file=None, dpi=DEFAULT_DPI, fmt=None):
+    """Построить графики по результатам бенчмарка из CSV-файла
+
+    Формат берётся из расширения output_file, иначе из fmt (см. _output_format).
+    True означает, что график построен и поставлен в очередь на запись.
+    Файл пишется в фоне: чтобы убедиться, что он записан, вызывающий код
+    должен вызвать _flush_writes() и проверить её результат
+    """
+
+    fmt = _output_format(output_file, fmt)
+    if fmt is None:
+        return False
     
     # Проверяем, существует ли файл
     if not os.path.exists(csv_file):
         print(f"Error: File not found: {csv_file}")
         return False
+
+    _import_plotting()
     
     # Читаем CSV
     try:
-        df = pd.read_csv(csv_file)
+        df = _load(csv_file)
     except Exception as e:
         print(f"Error reading CSV file: {e}")
         return False
@@ -117,16 +437,18 @@ def plot_results(csv_file, output_file=None):
         print(f"Error: CSV file must contain columns: {required_cols}")
         return False
     
-    # Создаём фигуру с подграфиками
-    fig, axs = plt.subplots(1, 3, figsize=(18, 6))
-    ax1, ax2, ax3 = axs
+    # Фигура с подграфиками берётся из кэша (см. _get_fig)
+    fig = _get_fig((1, 3), (18, 6))
+    ax1, ax2, ax3 = fig.axes
 
+    # Порядок сценариев задаётся reindex у сводных таблиц, поэтому копировать
+    # df ради перекодирования Benchmark в упорядоченную категорию не нужно
+    # (к тому же df может быть общим объектом из кэша _load)
     benchmark_order = _ordered_benchmarks(df['Benchmark'])
-    df = df.copy()
-    df['Benchmark'] = pd.Categorical(df['Benchmark'], categories=benchmark_order, ordered=True)
     
+    pivot_data, pivot_free, pivot_util = _metric_pivots(df, benchmark_order)
+
     # График 1: пропускная способность выделения (операций/сек) по сценариям
-    pivot_data = df.pivot(index='Benchmark', columns='Allocator', values='AllocOpsPerSec')
     pivot_data.plot(kind='bar', ax=ax1, rot=45)
     ax1.set_title('Allocation Throughput (ops/sec)', fontsize=14, fontweight='bold')
     ax1.set_xlabel('Benchmark Type', fontsize=12)
@@ -135,7 +457,6 @@ def plot_results(csv_file, output_file=None):
     ax1.grid(True, alpha=0.3)
     
     # График 2: пропускная способность освобождения (операций/сек) по сценариям
-    pivot_free = df.pivot(index='Benchmark', columns='Allocator', values='FreeOpsPerSec')
     pivot_free.plot(kind='bar', ax=ax2, rot=45)
     ax2.set_title('Deallocation Throughput (ops/sec)', fontsize=14, fontweight='bold')
     ax2.set_xlabel('Benchmark Type', fontsize=12)
@@ -145,44 +466,72 @@ def plot_results(csv_file, output_file=None):
 
     # График 3: PeakUtilization отдельно по каждому сценарию
     # Требуемый вид: 4 столбца на аллокатор (по сценариям)
-    pivot_util = df.pivot_table(index='Allocator', columns='Benchmark', values='PeakUtilization', aggfunc='mean', observed=False)
-    pivot_util = pivot_util.reindex(columns=benchmark_order)
     pivot_util.plot(kind='bar', ax=ax3, rot=0)
-    ax3.set_title('Peak Memory Utilization (PeakRequested/HeapSize)', fontsize=14, fontweight='bold')
+    ax3.set_title('Peak Memory Utilization\n(PeakRequested/HeapSize)', fontsize=14, fontweight='bold')
     ax3.set_xlabel('Allocator', fontsize=12)
     ax3.set_ylabel('PeakRequested/HeapSize', fontsize=12)
     ax3.legend(title='Benchmark', fontsize=10)
     ax3.grid(True, alpha=0.3)
     
-    # Подгоняем разметку
-    plt.tight_layout()
-    
-    # Сохраняем график
     if output_file:
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
-        print(f"Plot saved to: {output_file}")
+        _save_figure(fig, output_file, dpi, fmt, f"Plot saved to: {output_file}")
     else:
         # Генерируем имя по умолчанию
-        output_file = csv_file.replace('.csv', '.png')
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
-        print(f"Plot saved to: {output_file}")
+        output_file = csv_file.replace('.csv', f'.{fmt}')
+        _save_figure(fig, output_file, dpi, fmt, f"Plot saved to: {output_file}")
     
-    plt.close()
     return True
 
-def plot_comparison(files, output_file='comparison.png'):
-    """Построить сравнительный график по нескольким файлам результатов"""
+def plot_batch(files, dpi=DEFAULT_DPI, fmt=None):
+    """Построить отдельные графики для каждого CSV-файла
+
+    Все файлы рисуются на одной кэшированной фигуре (см. _get_fig),
+    результат сохраняется рядом с входным файлом. Как и для plot_results,
+    запись файлов завершается только в _flush_writes()
+    """
+
+    ok = True
+    for file in files:
+        ok = plot_results(file, dpi=dpi, fmt=fmt) and ok
+    return ok
+
+def plot_comparison(files, output_file=None, dpi=DEFAULT_DPI, fmt=None):
+    """Построить сравнительный график по нескольким файлам результатов
+
+    Как и для plot_results, формат определяется через _output_format, а True
+    означает лишь постановку файла в очередь на запись; дождаться записи
+    и узнать об ошибках — через _flush_writes()
+    """
+
+    fmt = _output_format(output_file, fmt)
+    if fmt is None:
+        return False
+    if output_file is None:
+        output_file = f'comparison.{fmt}'
     
-    all_data = []
+    existing = []
     for file in files:
         if not os.path.exists(file):
             print(f"Warning: File not found: {file}")
             continue
-        try:
-            df = pd.read_csv(file)
-            all_data.append(df)
-        except Exception as e:
-            print(f"Warning: Error reading {file}: {e}")
+        existing.append(file)
+
+    if not existing:
+        print("Error: No valid data files")
+        return False
+
+    _import_plotting()
+
+    # Файлы читаем параллельно; результаты собираем в порядке аргументов,
+    # чтобы порядок аллокаторов на графиках не зависел от скорости чтения
+    all_data = []
+    with ThreadPoolExecutor(max_workers=min(8, len(existing))) as ex:
+        futures = [(file, ex.submit(_load, file)) for file in existing]
+        for file, fut in futures:
+            try:
+                all_data.append(fut.result())
+            except Exception as e:
+                print(f"Warning: Error reading {file}: {e}")
     
     if not all_data:
         print("Error: No valid data files")
@@ -192,21 +541,15 @@ def plot_comparison(files, output_file='comparison.png'):
     combined = pd.concat(all_data, ignore_index=True)
 
     benchmark_order = _ordered_benchmarks(combined['Benchmark'])
-    combined = combined.copy()
-    combined['Benchmark'] = pd.Categorical(combined['Benchmark'], categories=benchmark_order, ordered=True)
     
-    # Создаём общий сравнительный график
-    fig = plt.figure(figsize=(18, 10))
+    # Создаём общий сравнительный график (фигура берётся из кэша, см. _get_fig)
+    # Четвёртая ячейка сетки отдана под текстовую сводку, оси для неё не нужны
+    fig = _get_fig((2, 2), (18, 10), count=3)
+    ax1, ax2, ax3 = fig.axes
     
+    pivot_ops, pivot_time, pivot_util = _metric_pivots(combined, benchmark_order)
+
     # График 1: средняя скорость выделения
-    ax1 = plt.subplot(2, 2, 1)
-    pivot_ops = combined.pivot_table(
-        index='Benchmark', 
-        columns='Allocator', 
-        values='AllocOpsPerSec', 
-        aggfunc='mean',
-        observed=False
-    )
     pivot_ops.plot(kind='bar', ax=ax1, rot=45)
     ax1.set_title('Average Allocation Throughput (ops/sec)', fontsize=12, fontweight='bold')
     ax1.set_xlabel('Benchmark Type')
@@ -215,14 +558,6 @@ def plot_comparison(files, output_file='comparison.png'):
     ax1.grid(True, alpha=0.3)
     
     # График 2: средняя скорость освобождения
-    ax2 = plt.subplot(2, 2, 2)
-    pivot_time = combined.pivot_table(
-        index='Benchmark', 
-        columns='Allocator', 
-        values='FreeOpsPerSec', 
-        aggfunc='mean',
-        observed=False
-    )
     pivot_time.plot(kind='bar', ax=ax2, rot=45)
     ax2.set_title('Average Deallocation Throughput (ops/sec)', fontsize=12, fontweight='bold')
     ax2.set_xlabel('Benchmark Type')
@@ -231,15 +566,6 @@ def plot_comparison(files, output_file='comparison.png'):
     ax2.grid(True, alpha=0.3)
     
     # График 3: PeakUtilization по каждому сценарию (4 столбца на аллокатор)
-    ax3 = plt.subplot(2, 2, 3)
-    pivot_util = combined.pivot_table(
-        index='Allocator',
-        columns='Benchmark',
-        values='PeakUtilization',
-        aggfunc='mean',
-        observed=False
-    )
-    pivot_util = pivot_util.reindex(columns=benchmark_order)
     pivot_util.plot(kind='bar', ax=ax3, rot=0)
     ax3.set_title('Peak Memory Utilization by Benchmark (PeakRequested/HeapSize)', fontsize=12, fontweight='bold')
     ax3.set_xlabel('Allocator')
@@ -247,30 +573,40 @@ def plot_comparison(files, output_file='comparison.png'):
     ax3.legend(title='Benchmark', fontsize=9)
     ax3.grid(True, alpha=0.3)
     
-    # График 4: краткая сводка
-    ax4 = plt.subplot(2, 2, 4)
-    ax4.axis('off')
+    # График 4: краткая сводка — текст прямо на фигуре в правой нижней ячейке сетки
     
     # Считаем сводные показатели
+    # Средние по аллокатору — одной группировкой вместо фильтрации на каждый аллокатор
+    summary_df = combined.groupby('Allocator', observed=True, sort=False)[METRIC_COLS].mean()
     summary_text = "Summary Statistics\n\n"
-    for allocator in combined['Allocator'].unique():
-        alloc_data = combined[combined['Allocator'] == allocator]
-        avg_alloc = alloc_data['AllocOpsPerSec'].mean()
-        avg_free = alloc_data['FreeOpsPerSec'].mean()
-        avg_util = alloc_data['PeakUtilization'].mean()
+    for allocator, avg_alloc, avg_free, avg_util in summary_df.itertuples(index=True, name=None):
         summary_text += f"{allocator}:\n"
         summary_text += f"  Avg alloc (ops/sec): {avg_alloc:,.0f}\n"
         summary_text += f"  Avg free  (ops/sec): {avg_free:,.0f}\n"
         summary_text += f"  Avg peak util (PeakRequested/HeapSize): {avg_util:.4f}\n\n"
     
-    ax4.text(0.1, 0.9, summary_text, transform=ax4.transAxes,
-             fontsize=11, verticalalignment='top', family='monospace',
-             bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+    summary = fig.text(0, 0, summary_text, transform=fig.transFigure,
+                       fontsize=SUMMARY_FONTSIZE, verticalalignment='top', family='monospace',
+                       bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
+    # Холст не расширяется под текст при сохранении, поэтому длинную сводку
+    # (много аллокаторов) уменьшаем, чтобы она поместилась до низа фигуры,
+    # но не мельче SUMMARY_MIN_FONTSIZE: дальше вместо кегля растёт высота фигуры.
+    # Положение ячейки зависит от разметки, поэтому сначала применяем layout
+    # engine (только расчёт положений осей, без растеризации) и берём
+    # координаты ячейки из GridSpec
+    for _ in range(4):
+        _apply_layout(fig)
+        cell = ax3.get_subplotspec().get_gridspec()[1, 1].get_position(fig)
+        summary.set_position((cell.x0 + 0.1 * cell.width, cell.y1))
+        available = cell.y1 * fig.bbox.height
+        if _fit_text_height(summary, available, SUMMARY_MIN_FONTSIZE):
+            break
+        # Прибавка высоты делится между двумя строками сетки, поэтому
+        # нехватку по высоте добавляем в двойном размере
+        missing = _text_height(summary) - available
+        fig.set_figheight(fig.get_figheight() + 2 * missing / fig.dpi)
     
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    print(f"Comparison plot saved to: {output_file}")
-    plt.close()
+    _save_figure(fig, output_file, dpi, fmt, f"Comparison plot saved to: {output_file}")
     
     return True
 
@@ -285,7 +621,8 @@ def main():
     )
     parser.add_argument(
         '-o', '--output',
-        help='Файл изображения на выходе (по умолчанию: как входной, но с расширением .png)'
+        help='Файл изображения на выходе (по умолчанию: как входной, но с расширением формата; '
+             'для нескольких файлов без -c график строится для каждого)'
     )
     parser.add_argument(
         '-c', '--comparison',
@@ -293,17 +630,52 @@ def main():
         help='Построить сравнительный график по нескольким файлам'
     )
     
+    parser.add_argument(
+        '--format',
+        choices=OUTPUT_FORMATS,
+        help='Формат изображения (по умолчанию: по расширению -o, иначе png; '
+             'svg/pdf сохраняются без растеризации)'
+    )
+    parser.add_argument(
+        '--dpi',
+        type=int,
+        default=DEFAULT_DPI,
+        help=f'Разрешение PNG (по умолчанию: {DEFAULT_DPI})'
+    )
+    parser.add_argument(
+        '--publish',
+        action='store_true',
+        help=f'Сохранить в разрешении для публикации (dpi={PUBLISH_DPI})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Не кэшировать разобранные CSV (если файлы перезаписываются во время работы)'
+    )
+    
     args = parser.parse_args()
+
+    global _CACHE_ENABLED
+    _CACHE_ENABLED = not args.no_cache
+    dpi = PUBLISH_DPI if args.publish else args.dpi
+
+    # Несовместимые -o и --format отклоняем до чтения данных
+    if _output_format(args.output, args.format) is None:
+        return 1
     
     if args.comparison and len(args.input_files) > 1:
-        output = args.output if args.output else 'comparison.png'
-        plot_comparison(args.input_files, output)
+        plot_comparison(args.input_files, args.output, dpi=dpi, fmt=args.format)
     elif len(args.input_files) == 1:
-        plot_results(args.input_files[0], args.output)
-    else:
-        print("Error: For single file plotting, provide one input file")
+        plot_results(args.input_files[0], args.output, dpi=dpi, fmt=args.format)
+    elif args.output:
+        print("Error: -o/--output can only be used with a single input file")
         print("       For comparison, use -c/--comparison flag with multiple files")
         return 1
+    else:
+        plot_batch(args.input_files, dpi=dpi, fmt=args.format)
+
+    if not _flush_writes():
+        return 1
     
     return 0
 